@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlmodel import Session, select
+
+from app.db.session import get_session
+from app.db.models import Branch, Node
+from app.db.graph_schemas import CompareResponse
+from app.core.archive_service import archive_service
+from app.api.nodes import compare_node_pair
+
+router = APIRouter()
+
+
+@router.get("/branches/{branch_id}/compare/{other_branch_id}", response_model=CompareResponse)
+async def compare_branches(
+    branch_id: int,
+    other_branch_id: int,
+    limit: int = Query(200, ge=0, le=5000),
+    session: Session = Depends(get_session),
+):
+    """Compare the heads (last nodes) of two branches."""
+    archive_service.ensure_hot_for_branch(branch_id)
+    archive_service.ensure_hot_for_branch(other_branch_id)
+    return compare_node_pair(
+        session,
+        _branch_head(session, branch_id),
+        _branch_head(session, other_branch_id),
+        limit,
+    )
+
+
+def _branch_head(session: Session, branch_id: int) -> int:
+    if not session.get(Branch, branch_id):
+        raise HTTPException(status_code=404, detail="Branch not found")
+    head = session.exec(
+        select(Node.id).where(Node.branch_id == branch_id).order_by(Node.sequence.desc()).limit(1)
+    ).first()
+    if head is None:
+        raise HTTPException(status_code=404, detail="Branch has no nodes")
+    return head
@@ -1,12 +1,29 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from sqlmodel import Session
+import base64
+import json
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Response, status
+from sqlalchemy import and_, or_
+from sqlmodel import Session, select
 from app.db.session import engine, get_session
-from app.db.models import Graph, Branch, Node
+from app.db.models import Graph, Branch, Node, GraphSummary, GraphArchive
 from app.db.graph_schemas import (
     GraphStateResponse,
     SerializableNodeResponse,
     SerializableBranchResponse,
+    GraphHistoryResponse,
+    GraphEventResponse,
+    GraphListResponse,
+    GraphSummaryResponse,
 )
+from app.core.history_service import (
+    history_service,
+    graph_op,
+    branch_op,
+    node_op,
+    graph_from_state,
+)
+from app.core.archive_service import archive_service
+from app.core.render_service import render_service, MEDIA_TYPES
 from app.db.node_schemas import RootNodeCreate
 from datetime import datetime
 
@@ -60,12 +77,103 @@ def convert_graph_to_response(graph: Graph) -> GraphStateResponse:
     )
 
 
+# Sortable columns for GET /graphs; graph id breaks ties so keyset cursors are unique
+GRAPH_SORT_COLUMNS = {
+    "last_activity": GraphSummary.last_activity,
+    "name": Graph.name,
+    "node_count": GraphSummary.node_count,
+    "max_depth": GraphSummary.max_depth,
+}
+
+
+def _encode_cursor(sort_value, graph_id: str) -> str:
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, graph_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str, sort: str):
+    try:
+        sort_value, graph_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort == "last_activity":
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, graph_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/graphs", response_model=GraphListResponse)
+async def list_graphs(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    sort: str = Query("last_activity", pattern="^(last_activity|name|node_count|max_depth)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    q: Optional[str] = Query(None, description="Case-insensitive substring match on graph name"),
+    min_nodes: Optional[int] = Query(None, ge=0),
+    active_since: Optional[datetime] = None,
+    session: Session = Depends(get_session),
+):
+    """
+    List graph summaries with keyset pagination. Counts come from GraphSummary,
+    so no branches or nodes are loaded.
+    """
+    column = GRAPH_SORT_COLUMNS[sort]
+    descending = order == "desc"
+
+    stmt = (
+        select(Graph.id, Graph.name, GraphSummary, GraphArchive.graph_id)
+        .join(GraphSummary, GraphSummary.graph_id == Graph.id)
+        .outerjoin(GraphArchive, GraphArchive.graph_id == Graph.id)
+    )
+    if q:
+        stmt = stmt.where(Graph.name.ilike(f"%{q}%"))
+    if min_nodes is not None:
+        stmt = stmt.where(GraphSummary.node_count >= min_nodes)
+    if active_since is not None:
+        stmt = stmt.where(GraphSummary.last_activity >= active_since)
+    if cursor:
+        after_value, after_id = _decode_cursor(cursor, sort)
+        if descending:
+            stmt = stmt.where(or_(column < after_value, and_(column == after_value, Graph.id < after_id)))
+        else:
+            stmt = stmt.where(or_(column > after_value, and_(column == after_value, Graph.id > after_id)))
+
+    if descending:
+        stmt = stmt.order_by(column.desc(), Graph.id.desc())
+    else:
+        stmt = stmt.order_by(column.asc(), Graph.id.asc())
+
+    # Fetch one extra row to know whether another page exists
+    rows = session.exec(stmt.limit(limit + 1)).all()
+    items = [
+        GraphSummaryResponse(
+            id=graph_id,
+            name=name,
+            nodeCount=summary.node_count,
+            branchCount=summary.branch_count,
+            maxDepth=summary.max_depth,
+            lastActivity=summary.last_activity,
+            archived=archived_id is not None,
+        )
+        for graph_id, name, summary, archived_id in rows[:limit]
+    ]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last_id, last_name, last_summary, _ = rows[limit - 1]
+        last_value = last_name if sort == "name" else getattr(last_summary, sort)
+        next_cursor = _encode_cursor(last_value, last_id)
+    return GraphListResponse(items=items, nextCursor=next_cursor)
+
+
 @router.get("/graphs/{graph_id}", response_model=GraphStateResponse)
 async def get_graph_state(graph_id: str):
     """
     Fetches the state of a graph. If the graph doesn't exist, create an EMPTY one.
-    (No branches or nodes are seeded here.)
+    (No branches or nodes are seeded here.) Archived graphs are rehydrated first.
     """
+    archive_service.ensure_hot(graph_id)
     with Session(engine) as session:
         graph = session.get(Graph, graph_id)
 
@@ -73,6 +181,8 @@ async def get_graph_state(graph_id: str):
             print(f"Graph '{graph_id}' not found. Creating empty graph.")
             graph = Graph(id=graph_id, name=f"Project {graph_id}")
             session.add(graph)
+            session.flush()
+            history_service.record(session, graph.id, "create_graph", [graph_op(graph)])
             session.commit()
             session.refresh(graph)
 
@@ -85,10 +195,13 @@ async def create_root_node(graph_id: str, request: RootNodeCreate, session: Sess
     Create the root branch + first node in a graph.
     If a root branch already exists, return the current graph state (idempotent).
     """
+    archive_service.ensure_hot(graph_id)
     graph = session.get(Graph, graph_id)
     if not graph:
         graph = Graph(id=graph_id, name=f"Project {graph_id}")
         session.add(graph)
+        session.flush()
+        history_service.record(session, graph.id, "create_graph", [graph_op(graph)])
         session.commit()
         session.refresh(graph)
 
@@ -102,8 +215,6 @@ async def create_root_node(graph_id: str, request: RootNodeCreate, session: Sess
     # Otherwise create a new root branch + root node
     root_branch = Branch(label="Main Chat", graph=graph)
     session.add(root_branch)
-    session.commit()
-    session.refresh(root_branch)
 
     first_node = Node(
         sequence=1,
@@ -113,6 +224,10 @@ async def create_root_node(graph_id: str, request: RootNodeCreate, session: Sess
         branch=root_branch,
     )
     session.add(first_node)
+    session.flush()
+    history_service.record(
+        session, graph.id, "create_root", [branch_op(root_branch), node_op(first_node)]
+    )
     session.commit()
 
     session.refresh(graph)
@@ -130,6 +245,77 @@ async def delete_graph(graph_id: str, session: Session = Depends(get_session)):
     if not graph:
         raise HTTPException(status_code=404, detail="Graph not found")
 
+    history_service.purge(session, graph_id)
+    archive_service.purge(session, graph_id)
     session.delete(graph)
     session.commit()
+    render_service.purge(graph_id)
     return
+
+
+@router.get("/graphs/{graph_id}/history", response_model=GraphHistoryResponse)
+async def get_graph_history(
+    graph_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    session: Session = Depends(get_session),
+):
+    """List the newest events in a graph's history and which version is live."""
+    if not session.get(Graph, graph_id):
+        raise HTTPException(status_code=404, detail="Graph not found")
+
+    head, events = history_service.history(session, graph_id, limit=limit)
+    return GraphHistoryResponse(
+        graphId=graph_id,
+        currentVersion=head.current_version,
+        latestVersion=head.latest_version,
+        events=[
+            GraphEventResponse(
+                version=e.version,
+                parentVersion=e.parent_version,
+                kind=e.kind,
+                createdAt=e.created_at,
+            )
+            for e in events
+        ],
+    )
+
+
+@router.get("/graphs/{graph_id}/versions/{version}", response_model=GraphStateResponse)
+async def get_graph_at_version(graph_id: str, version: int, session: Session = Depends(get_session)):
+    """Return the graph as it was at a past version (read-only; the live graph is untouched)."""
+    if not session.get(Graph, graph_id):
+        raise HTTPException(status_code=404, detail="Graph not found")
+
+    state = history_service.state_at(session, graph_id, version)
+    return convert_graph_to_response(graph_from_state(graph_id, state))
+
+
+@router.post("/graphs/{graph_id}/undo", response_model=GraphStateResponse)
+async def undo_graph(graph_id: str):
+    """Step the live graph back to the previous version."""
+    archive_service.ensure_hot(graph_id)
+    history_service.undo(graph_id)
+    return await get_graph_state(graph_id=graph_id)
+
+
+@router.post("/graphs/{graph_id}/redo", response_model=GraphStateResponse)
+async def redo_graph(graph_id: str):
+    """Re-apply the most recently undone version."""
+    archive_service.ensure_hot(graph_id)
+    history_service.redo(graph_id)
+    return await get_graph_state(graph_id=graph_id)
+
+
+@router.get("/graphs/{graph_id}/render")
+async def render_graph(
+    graph_id: str,
+    format: str = Query("svg", pattern="^(svg|png)$"),
+    node_id: Optional[int] = Query(None, description="Render only this node and its descendants"),
+):
+    """Render a graph (or the subtree under `node_id`) to SVG or PNG. Cached per graph version."""
+    data = await render_service.render(graph_id, format, node_id)
+    return Response(
+        content=data,
+        media_type=MEDIA_TYPES[format],
+        headers={"Cache-Control": "private, max-age=60"},
+    )
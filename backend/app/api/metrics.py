@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends
+from sqlmodel import Session
+
+from app.db.session import get_session
+from app.db.graph_schemas import StorageMetricsResponse
+from app.core.archive_service import archive_service
+
+router = APIRouter()
+
+
+@router.get("/metrics/storage", response_model=StorageMetricsResponse)
+async def get_storage_metrics(session: Session = Depends(get_session)):
+    """Report how much graph data sits in the hot tables versus the cold-storage archive."""
+    return archive_service.storage_stats(session)
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlmodel import Session
 
 from app.db.session import get_session, engine
 from app.db.models import Node, Graph
 from app.core.agent_service import agent_service
+from app.core.history_service import history_service, removal_op
+from app.core.ancestry_service import ancestry_service
+from app.core.archive_service import archive_service
 from app.api.graphs import convert_graph_to_response, get_graph_state
-from app.db.graph_schemas import GraphStateResponse
+from app.db.graph_schemas import GraphStateResponse, CompareResponse, CompareSideResponse
 from app.db.node_schemas import SubBranchRequest, NodeCreate
 
 router = APIRouter()
@@ -13,6 +16,7 @@ router = APIRouter()
 @router.post("/nodes/{node_id}/extend", response_model=GraphStateResponse)
 async def extend_node(node_id: int, payload: NodeCreate):
     """Extend the conversation from the given node by appending a new node to its branch."""
+    archive_service.ensure_hot_for_node(node_id)
     try:
         graph_id = agent_service.extend_branch(
             node_id,
@@ -38,6 +42,7 @@ async def create_sub_branch_from_node(node_id: int, request: SubBranchRequest):
     """
     Agentic action to create a new sub-branch from a specific node.
     """
+    archive_service.ensure_hot_for_node(node_id)
     # Call the new service function with the correct content
     graph_id = agent_service.create_sub_branch(
         parent_node_id=node_id,
@@ -51,12 +56,16 @@ async def create_sub_branch_from_node(node_id: int, request: SubBranchRequest):
 @router.post("/nodes/{node_id}/delete", response_model=GraphStateResponse)
 async def delete_node(node_id: int, session: Session = Depends(get_session)):
     """Delete this node and everything that descends from it, then return updated graph state."""
+    archive_service.ensure_hot_for_node(node_id)
     node = session.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
 
     graph_id = node.branch.graph_id
-    _delete_node_recursive(node, session)
+    # Keep every delete pending until record() so removal_op sees all of them
+    with session.no_autoflush:
+        _delete_node_recursive(node, session)
+    history_service.record(session, graph_id, "delete_node", [removal_op(session)])
     session.commit()
 
     graph = session.get(Graph, graph_id)
@@ -68,16 +77,19 @@ async def delete_node(node_id: int, session: Session = Depends(get_session)):
 @router.post("/nodes/{node_id}/delete-extension", response_model=GraphStateResponse)
 async def delete_extension(node_id: int, session: Session = Depends(get_session)):
     """Delete all ancestors of this node in the same branch (but keep this node), then return graph state."""
+    archive_service.ensure_hot_for_node(node_id)
     node = session.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
 
     graph_id = node.branch.graph_id
     branch_nodes = sorted(node.branch.nodes, key=lambda n: n.sequence)
-    for n in branch_nodes:
-        if n.sequence < node.sequence:
-            _delete_node_recursive(n, session)
+    with session.no_autoflush:
+        for n in branch_nodes:
+            if n.sequence < node.sequence:
+                _delete_node_recursive(n, session)
 
+    history_service.record(session, graph_id, "delete_extension", [removal_op(session)])
     session.commit()
     graph = session.get(Graph, graph_id)
     if not graph:
@@ -88,23 +100,69 @@ async def delete_extension(node_id: int, session: Session = Depends(get_session)
 @router.post("/nodes/{node_id}/delete-children", response_model=GraphStateResponse)
 async def delete_children(node_id: int, session: Session = Depends(get_session)):
     """Delete all descendants of this node (but keep this node itself) and return graph state."""
+    archive_service.ensure_hot_for_node(node_id)
     node = session.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
 
     graph_id = node.branch.graph_id
     # Delete all child branches and their nodes
-    for child_branch in list(node.sub_branches):
-        for n in list(child_branch.nodes):
-            _delete_node_recursive(n, session)
-        session.delete(child_branch)
+    with session.no_autoflush:
+        for child_branch in list(node.sub_branches):
+            for n in list(child_branch.nodes):
+                _delete_node_recursive(n, session)
+            session.delete(child_branch)
 
+    history_service.record(session, graph_id, "delete_children", [removal_op(session)])
     session.commit()
     graph = session.get(Graph, graph_id)
     if not graph:
         raise HTTPException(status_code=404, detail="Graph not found after deletion")
     return convert_graph_to_response(graph)
 
+@router.get("/nodes/{node_id}/compare/{other_node_id}", response_model=CompareResponse)
+async def compare_nodes(
+    node_id: int,
+    other_node_id: int,
+    limit: int = Query(200, ge=0, le=5000),
+    session: Session = Depends(get_session),
+):
+    """Find where two nodes' conversations diverged and what each side added since."""
+    archive_service.ensure_hot_for_node(node_id)
+    archive_service.ensure_hot_for_node(other_node_id)
+    return compare_node_pair(session, node_id, other_node_id, limit)
+
+
+def compare_node_pair(session: Session, node_id: int, other_node_id: int, limit: int) -> CompareResponse:
+    node = session.get(Node, node_id)
+    other = session.get(Node, other_node_id)
+    if not node or not other:
+        raise HTTPException(status_code=404, detail="Node not found")
+    graph_id = node.branch.graph_id
+    if other.branch.graph_id != graph_id:
+        raise HTTPException(status_code=400, detail="Nodes belong to different graphs")
+
+    ancestry_service.ensure_indexed(session, graph_id, node_id, other_node_id)
+    ancestor_id = ancestry_service.lowest_common_ancestor(session, node_id, other_node_id)
+    ancestor_depth = ancestry_service.depth(session, ancestor_id) if ancestor_id else 0
+
+    def side(nid: int) -> CompareSideResponse:
+        depth = ancestry_service.depth(session, nid)
+        return CompareSideResponse(
+            nodeId=nid,
+            depth=depth,
+            divergentCount=depth - ancestor_depth,
+            nodeIds=ancestry_service.path_since(session, nid, ancestor_depth, limit=limit),
+        )
+
+    return CompareResponse(
+        commonAncestorId=ancestor_id,
+        commonAncestorDepth=ancestor_depth,
+        left=side(node_id),
+        right=side(other_node_id),
+    )
+
+
 def _delete_node_recursive(node: Node, session: Session):
     # Delete child branches first
     for branch in node.sub_branches:
@@ -4,6 +4,7 @@ from datetime import datetime
 
 from app.db.session import engine
 from app.db.models import Node, Branch, Graph
+from app.core.history_service import history_service, graph_op, branch_op, node_op
 
 
 class AgentService:
@@ -32,6 +33,8 @@ class AgentService:
             )
 
             session.add(new_node)
+            session.flush()
+            history_service.record(session, branch.graph_id, "extend", [node_op(new_node)])
             session.commit()
 
             return branch.graph_id
@@ -62,6 +65,13 @@ class AgentService:
 
             session.add(new_branch)
             session.add(first_node)
+            session.flush()
+            history_service.record(
+                session,
+                new_branch.graph_id,
+                "branch",
+                [branch_op(new_branch), node_op(first_node)],
+            )
             session.commit()
 
             return parent_node.branch.graph_id
@@ -76,13 +86,13 @@ class AgentService:
             if not graph:
                 graph = Graph(id=graph_id, name=f"Project {graph_id}")
                 session.add(graph)
+                session.flush()
+                history_service.record(session, graph.id, "create_graph", [graph_op(graph)])
                 session.commit()
                 session.refresh(graph)
 
             root_branch = Branch(label="Main Chat", graph=graph)
             session.add(root_branch)
-            session.commit()
-            session.refresh(root_branch)
 
             first_node = Node(
                 sequence=1,
@@ -92,6 +102,10 @@ class AgentService:
                 branch=root_branch,
             )
             session.add(first_node)
+            session.flush()
+            history_service.record(
+                session, graph.id, "create_root", [branch_op(root_branch), node_op(first_node)]
+            )
             session.commit()
 
             return graph.id
@@ -0,0 +1,269 @@
+import json
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func
+from sqlmodel import Session, select
+
+from app.db.models import Branch, Node, NodeAncestry
+
+
+class AncestryService:
+    """
+    Ancestry index over conversation trees (binary lifting).
+
+    A node's parent is the previous node in its branch, or the node the branch
+    forked from. Each NodeAncestry row stores the node's parent, depth and
+    2**k-th ancestors, so a new node's depth is its parent's depth plus one,
+    the deepest node of a graph is one indexed MAX away, and the lowest common
+    ancestor of two nodes is found with O(log depth) primary-key lookups
+    instead of walking up the tree.
+    """
+
+    # --- maintenance --------------------------------------------------------
+
+    def on_mutation(self, session: Session, graph_id: str, ops: List[dict]) -> None:
+        """Update the index for operations already applied in `session`."""
+        session.flush()
+        if not self.is_indexed(session, graph_id):
+            self.rebuild(session, graph_id)
+            return
+
+        for op in ops:
+            if op["op"] == "add_node":
+                if not self._add_node(session, graph_id, op["id"]):
+                    self.rebuild(session, graph_id)
+                    return
+            elif op["op"] == "remove" and op["node_ids"]:
+                removed = op["node_ids"]
+                session.execute(delete(NodeAncestry).where(NodeAncestry.node_id.in_(removed)))
+                # Deleting from the middle of a branch re-parents the nodes after
+                # it, which shifts every depth below them
+                orphaned = session.exec(
+                    select(NodeAncestry.node_id).where(NodeAncestry.parent_id.in_(removed)).limit(1)
+                ).first()
+                if orphaned is not None:
+                    self.rebuild(session, graph_id)
+                    return
+
+    def rebuild(self, session: Session, graph_id: str) -> Dict[int, int]:
+        """Recompute the whole index for a graph. Returns {node_id: depth}."""
+        parents, branches = self._parents(session, graph_id)
+
+        depths: Dict[int, int] = {}
+        jumps: Dict[int, List[int]] = {}
+        for node_id in self._topological(parents):
+            parent = parents[node_id]
+            if parent is None:
+                depths[node_id] = 1
+                jumps[node_id] = []
+            else:
+                depths[node_id] = depths[parent] + 1
+                jumps[node_id] = self._lift(parent, lambda n: jumps[n])
+
+        session.execute(delete(NodeAncestry).where(NodeAncestry.graph_id == graph_id))
+        session.add_all(
+            NodeAncestry(
+                node_id=node_id,
+                graph_id=graph_id,
+                branch_id=branches[node_id],
+                parent_id=parents[node_id],
+                depth=depths[node_id],
+                jumps=json.dumps(jumps[node_id]),
+            )
+            for node_id in depths
+        )
+        session.flush()
+        return depths
+
+    def purge(self, session: Session, graph_id: str) -> None:
+        session.execute(delete(NodeAncestry).where(NodeAncestry.graph_id == graph_id))
+
+    # --- queries ------------------------------------------------------------
+
+    def depth(self, session: Session, node_id: int) -> int:
+        row = session.get(NodeAncestry, node_id)
+        return row.depth if row else 0
+
+    def max_depth(self, session: Session, graph_id: str) -> int:
+        return session.exec(
+            select(func.max(NodeAncestry.depth)).where(NodeAncestry.graph_id == graph_id)
+        ).one() or 0
+
+    def lowest_common_ancestor(self, session: Session, a: int, b: int) -> Optional[int]:
+        """Deepest node that is an ancestor of (or equal to) both `a` and `b`."""
+        rows: Dict[int, Tuple[int, List[int]]] = {}
+
+        def row(node_id: int) -> Tuple[int, List[int]]:
+            if node_id not in rows:
+                r = session.get(NodeAncestry, node_id)
+                rows[node_id] = (r.depth, json.loads(r.jumps))
+            return rows[node_id]
+
+        if row(a)[0] < row(b)[0]:
+            a, b = b, a
+        # Lift the deeper node to the same depth
+        diff = row(a)[0] - row(b)[0]
+        k = 0
+        while diff:
+            if diff & 1:
+                a = row(a)[1][k]
+            diff >>= 1
+            k += 1
+        if a == b:
+            return a
+
+        for k in reversed(range(len(row(a)[1]))):
+            jumps_a, jumps_b = row(a)[1], row(b)[1]
+            if k < len(jumps_a) and k < len(jumps_b) and jumps_a[k] != jumps_b[k]:
+                a, b = jumps_a[k], jumps_b[k]
+        parent_a, parent_b = row(a)[1][:1], row(b)[1][:1]
+        return parent_a[0] if parent_a and parent_a == parent_b else None
+
+    def path_since(self, session: Session, node_id: int, depth: int, limit: Optional[int] = None) -> List[int]:
+        """
+        Node ids on the path from the ancestor at `depth` (exclusive) down to
+        `node_id` (inclusive), root-side first. Reads one range of nodes per
+        branch segment rather than one row per node. With `limit`, only the
+        first `limit` ids of the path are returned, and only those are read.
+        """
+        if limit is not None and limit <= 0:
+            return []
+        remaining = self.depth(session, node_id) - depth
+        if limit is not None and remaining > limit:
+            # Jump straight to the last node wanted instead of reading the
+            # whole path back from `node_id`
+            node_id = self.ancestor_at(session, node_id, depth + limit)
+            remaining = limit
+        node = session.get(Node, node_id)
+        segments = []
+        while node is not None and remaining > 0:
+            ids = session.exec(
+                select(Node.id)
+                .where(Node.branch_id == node.branch_id, Node.sequence <= node.sequence)
+                .order_by(Node.sequence.desc())
+                .limit(remaining)
+            ).all()
+            segments.append(ids)
+            remaining -= len(ids)
+            branch = session.get(Branch, node.branch_id)
+            node = session.get(Node, branch.parent_node_id) if branch.parent_node_id else None
+
+        return [n for ids in reversed(segments) for n in reversed(ids)]
+
+    def ancestor_at(self, session: Session, node_id: int, depth: int) -> int:
+        """The ancestor of `node_id` at `depth`, in O(log depth) lookups
+        (`node_id` itself if it is not deeper than that)."""
+        row = session.get(NodeAncestry, node_id)
+        diff = row.depth - depth
+        k = 0
+        while diff > 0:
+            if diff & 1:
+                node_id = json.loads(row.jumps)[k]
+                row = session.get(NodeAncestry, node_id)
+            diff >>= 1
+            k += 1
+        return node_id
+
+    def ensure_indexed(self, session: Session, graph_id: str, *node_ids: int) -> None:
+        """Build the index for graphs created before it existed."""
+        if any(session.get(NodeAncestry, n) is None for n in node_ids):
+            self.rebuild(session, graph_id)
+            session.commit()
+            for n in node_ids:
+                if session.get(NodeAncestry, n) is None:
+                    raise HTTPException(status_code=404, detail=f"Node {n} not found")
+
+    def is_indexed(self, session: Session, graph_id: str) -> bool:
+        return session.exec(
+            select(NodeAncestry.node_id).where(NodeAncestry.graph_id == graph_id).limit(1)
+        ).first() is not None
+
+    # --- internals ----------------------------------------------------------
+
+    def _add_node(self, session: Session, graph_id: str, node_id: int) -> bool:
+        """Index a newly appended node. Returns False if its parent is not indexed."""
+        node = session.get(Node, node_id)
+        parent_id = session.exec(
+            select(Node.id)
+            .where(Node.branch_id == node.branch_id, Node.sequence < node.sequence)
+            .order_by(Node.sequence.desc())
+            .limit(1)
+        ).first()
+        if parent_id is None:
+            parent_id = session.get(Branch, node.branch_id).parent_node_id
+
+        if parent_id is None:
+            depth, jumps = 1, []
+        else:
+            parent = session.get(NodeAncestry, parent_id)
+            if parent is None:
+                return False
+            depth = parent.depth + 1
+            jumps = self._lift(
+                parent_id, lambda n: json.loads(session.get(NodeAncestry, n).jumps)
+            )
+
+        session.add(
+            NodeAncestry(
+                node_id=node_id,
+                graph_id=graph_id,
+                branch_id=node.branch_id,
+                parent_id=parent_id,
+                depth=depth,
+                jumps=json.dumps(jumps),
+            )
+        )
+        session.flush()
+        return True
+
+    def _lift(self, parent_id: int, jumps_of) -> List[int]:
+        """Jump table for a child of `parent_id`: entry k is jumps_of(entry k-1)[k-1]."""
+        jumps = [parent_id]
+        while True:
+            k = len(jumps) - 1
+            ancestor_jumps = jumps_of(jumps[k])
+            if k >= len(ancestor_jumps):
+                return jumps
+            jumps.append(ancestor_jumps[k])
+
+    def _parents(self, session: Session, graph_id: str) -> tuple:
+        """Return ({node_id: parent_id}, {node_id: branch_id}) for a graph, from ids only."""
+        branch_parents = dict(
+            session.exec(select(Branch.id, Branch.parent_node_id).where(Branch.graph_id == graph_id)).all()
+        )
+        rows = session.exec(
+            select(Node.id, Node.branch_id)
+            .join(Branch, Node.branch_id == Branch.id)
+            .where(Branch.graph_id == graph_id)
+            .order_by(Node.branch_id, Node.sequence)
+        ).all()
+
+        parents: Dict[int, Optional[int]] = {}
+        branches: Dict[int, int] = {}
+        previous: Dict[int, int] = {}
+        for node_id, branch_id in rows:
+            parents[node_id] = previous.get(branch_id, branch_parents.get(branch_id))
+            branches[node_id] = branch_id
+            previous[branch_id] = node_id
+        # A branch forked from a node that no longer exists starts a new root
+        for node_id, parent in parents.items():
+            if parent is not None and parent not in parents:
+                parents[node_id] = None
+        return parents, branches
+
+    def _topological(self, parents: Dict[int, Optional[int]]) -> List[int]:
+        """Order nodes so every parent comes before its children."""
+        children: Dict[Optional[int], List[int]] = {}
+        for node_id, parent in parents.items():
+            children.setdefault(parent, []).append(node_id)
+        order = []
+        stack = list(children.get(None, []))
+        while stack:
+            node_id = stack.pop()
+            order.append(node_id)
+            stack.extend(children.get(node_id, []))
+        return order
+
+
+ancestry_service = AncestryService()
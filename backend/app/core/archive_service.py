@@ -0,0 +1,244 @@
+import asyncio
+import json
+import random
+import zlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.db.session import engine
+from app.db.models import Graph, Branch, Node, GraphArchive, GraphHistory, GraphSummary, NodeAncestry
+from app.core.history_service import history_service
+from app.core.ancestry_service import ancestry_service
+from app.core.summary_service import summary_service
+
+
+class ArchiveService:
+    """
+    Cold storage for idle graphs.
+
+    A graph untouched for ARCHIVE_IDLE_DAYS has its branches and nodes packed
+    into one compressed GraphArchive row and removed from the hot tables. The
+    Graph row, its GraphSummary, its history and its NodeAncestry rows stay,
+    so listings and time travel keep working and node/branch ids still lead to
+    their graph. The next request that touches the graph rehydrates it with
+    the original ids.
+    """
+
+    def archive_graph(
+        self, session: Session, graph_id: str, idle_before: Optional[datetime] = None
+    ) -> Optional[GraphArchive]:
+        """
+        Pack a graph into a GraphArchive row and remove its hot rows. The graph
+        is locked first; with `idle_before`, nothing is archived (None is
+        returned) unless it is still idle once the lock is held. Raises a 409 if
+        rows other than the ones packed turn up, so a concurrent write is never
+        deleted without being archived.
+        """
+        summary = self._lock_graph(session, graph_id)
+        if idle_before is not None and (summary is None or summary.last_activity >= idle_before):
+            return None
+
+        if not ancestry_service.is_indexed(session, graph_id):
+            ancestry_service.rebuild(session, graph_id)
+        state = history_service.state_from_db(session, graph_id)
+        raw = json.dumps(state, separators=(",", ":")).encode()
+        data = zlib.compress(raw, 9)
+        archive = GraphArchive(
+            graph_id=graph_id,
+            data=data,
+            raw_size=len(raw),
+            compressed_size=len(data),
+            node_count=len(state["nodes"]),
+        )
+        session.add(archive)
+
+        # Delete exactly the rows that were packed (breaking branch -> node
+        # links first, as materialize does), then make sure nothing is left
+        branch_ids = [b["id"] for b in state["branches"].values()]
+        node_ids = [n["id"] for n in state["nodes"].values()]
+        if branch_ids:
+            session.execute(update(Branch).where(Branch.id.in_(branch_ids)).values(parent_node_id=None))
+        if node_ids:
+            session.execute(delete(Node).where(Node.id.in_(node_ids)))
+        leftover = session.exec(
+            select(Node.id).join(Branch, Node.branch_id == Branch.id).where(Branch.graph_id == graph_id).limit(1)
+        ).first() or session.exec(
+            select(Branch.id).where(Branch.graph_id == graph_id, Branch.id.not_in(branch_ids)).limit(1)
+        ).first()
+        if leftover is not None:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Graph '{graph_id}' changed while it was being archived",
+            )
+        if branch_ids:
+            session.execute(delete(Branch).where(Branch.id.in_(branch_ids)))
+        return archive
+
+    def rehydrate(self, session: Session, graph_id: str) -> bool:
+        """Move an archived graph back into the hot tables. Returns False if it was not archived."""
+        archive = session.get(GraphArchive, graph_id)
+        if archive is None:
+            return False
+
+        # The graph's NodeAncestry rows were kept, so only the hot tables change
+        state = json.loads(zlib.decompress(archive.data))
+        history_service.materialize(session, graph_id, state)
+        session.delete(archive)
+        summary_service.rebuild(session, graph_id)
+        return True
+
+    def archived_state(self, session: Session, graph_id: str) -> Optional[dict]:
+        """The stored state of an archived graph (without rehydrating it), or None if it is hot."""
+        archive = session.get(GraphArchive, graph_id)
+        return json.loads(zlib.decompress(archive.data)) if archive else None
+
+    def ensure_hot(self, graph_id: str) -> None:
+        """
+        Rehydrate `graph_id` if it is archived; a primary-key lookup otherwise.
+        If the rows cannot be restored the archive is kept and a 409 is raised.
+        """
+        with Session(engine) as session:
+            try:
+                if not self.rehydrate(session, graph_id):
+                    return
+                session.commit()
+            except (HTTPException, IntegrityError) as e:
+                session.rollback()
+                print(f"Could not rehydrate archived graph '{graph_id}': {e}")
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Graph '{graph_id}' is archived and could not be restored; the archive was kept",
+                )
+            print(f"Rehydrated archived graph '{graph_id}'.")
+
+    def ensure_hot_for_node(self, node_id: int) -> None:
+        """Rehydrate the graph `node_id` belongs to if it is archived."""
+        self._ensure_hot_where(NodeAncestry.node_id == node_id)
+
+    def ensure_hot_for_branch(self, branch_id: int) -> None:
+        """Rehydrate the graph `branch_id` belongs to if it is archived."""
+        self._ensure_hot_where(NodeAncestry.branch_id == branch_id)
+
+    def archive_idle(self) -> int:
+        """Archive one batch of graphs idle past the threshold. Returns how many were archived."""
+        cutoff = datetime.utcnow() - timedelta(days=settings.ARCHIVE_IDLE_DAYS)
+        with Session(engine) as session:
+            graph_ids = session.exec(
+                select(GraphSummary.graph_id)
+                .where(
+                    GraphSummary.last_activity < cutoff,
+                    GraphSummary.node_count > 0,
+                    ~select(GraphArchive.graph_id)
+                    .where(GraphArchive.graph_id == GraphSummary.graph_id)
+                    .exists(),
+                )
+                .order_by(GraphSummary.last_activity)
+                .limit(settings.ARCHIVE_BATCH_SIZE)
+            ).all()
+            archived = 0
+            for graph_id in graph_ids:
+                try:
+                    if self.archive_graph(session, graph_id, idle_before=cutoff) is None:
+                        session.rollback()
+                        continue
+                    session.commit()
+                    archived += 1
+                except HTTPException as e:
+                    session.rollback()
+                    print(f"Skipped archiving graph '{graph_id}': {e.detail}")
+            return archived
+
+    async def run_periodically(self) -> None:
+        """Background loop started from the app lifespan. The first run comes a
+        short, jittered delay after boot, so it neither competes with worker boot
+        nor waits a whole interval; later runs are one interval apart."""
+        delay = min(
+            settings.ARCHIVE_FIRST_RUN_DELAY_SECONDS * random.uniform(0.5, 1.5),
+            settings.ARCHIVE_CHECK_INTERVAL_SECONDS,
+        )
+        while True:
+            await asyncio.sleep(delay)
+            delay = settings.ARCHIVE_CHECK_INTERVAL_SECONDS
+            try:
+                archived = await asyncio.to_thread(self.archive_idle)
+                if archived:
+                    print(f"Archived {archived} idle graph(s).")
+            except Exception as e:
+                print(f"Archiver run failed: {e}")
+
+    def purge(self, session: Session, graph_id: str) -> None:
+        session.execute(delete(GraphArchive).where(GraphArchive.graph_id == graph_id))
+
+    def storage_stats(self, session: Session) -> dict:
+        """Row counts and byte sizes for the hot tables versus the archive."""
+        archived = session.exec(
+            select(
+                func.count(),
+                func.coalesce(func.sum(GraphArchive.node_count), 0),
+                func.coalesce(func.sum(GraphArchive.raw_size), 0),
+                func.coalesce(func.sum(GraphArchive.compressed_size), 0),
+            ).select_from(GraphArchive)
+        ).one()
+        total_graphs = session.exec(select(func.count()).select_from(Graph)).one()
+        hot_nodes, hot_content = session.exec(
+            select(func.count(), func.coalesce(func.sum(func.length(Node.content)), 0)).select_from(Node)
+        ).one()
+        hot_branches = session.exec(select(func.count()).select_from(Branch)).one()
+        return {
+            "hot": {
+                "graphs": total_graphs - archived[0],
+                "branches": hot_branches,
+                "nodes": hot_nodes,
+                "contentBytes": hot_content,
+            },
+            "archived": {
+                "graphs": archived[0],
+                "nodes": archived[1],
+                "rawBytes": archived[2],
+                "compressedBytes": archived[3],
+            },
+        }
+
+    def _lock_graph(self, session: Session, graph_id: str) -> Optional[GraphSummary]:
+        """
+        Lock a graph against mutations for the rest of the transaction: its
+        history head and summary are taken FOR UPDATE, in the order mutations
+        take them. SQLite ignores FOR UPDATE, so a no-op write to the summary
+        takes the database write lock there before anything is read.
+        """
+        session.exec(
+            select(GraphHistory.graph_id).where(GraphHistory.graph_id == graph_id).with_for_update()
+        ).first()
+        session.execute(
+            update(GraphSummary)
+            .where(GraphSummary.graph_id == graph_id)
+            .values(last_activity=GraphSummary.last_activity)
+        )
+        return session.exec(
+            select(GraphSummary)
+            .where(GraphSummary.graph_id == graph_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        ).first()
+
+    def _ensure_hot_where(self, condition) -> None:
+        # Archived graphs keep their NodeAncestry rows, which still map node and
+        # branch ids to the graph; for hot graphs the join finds nothing
+        with Session(engine) as session:
+            graph_id = session.exec(
+                select(GraphArchive.graph_id)
+                .join(NodeAncestry, NodeAncestry.graph_id == GraphArchive.graph_id)
+                .where(condition)
+                .limit(1)
+            ).first()
+        if graph_id is not None:
+            self.ensure_hot(graph_id)
+
+
+archive_service = ArchiveService()
@@ -0,0 +1,348 @@
+import json
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, update
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.db.session import engine
+from app.db.models import Graph, Branch, Node, GraphHistory, GraphEvent, GraphSnapshot
+from app.core.ancestry_service import ancestry_service
+from app.core.summary_service import summary_service
+
+
+# --- State operations -------------------------------------------------------
+#
+# Every event stores the list of operations that turn the state at its parent
+# version into the state at its own version. A state is a plain JSON dict:
+#   {"name": str, "branches": {id: {...}}, "nodes": {id: {...}}}
+
+
+def graph_op(graph: Graph) -> dict:
+    return {"op": "create_graph", "name": graph.name}
+
+
+def branch_op(branch: Branch) -> dict:
+    return {
+        "op": "add_branch",
+        "id": branch.id,
+        "label": branch.label,
+        "parent_node_id": branch.parent_node_id,
+    }
+
+
+def node_op(node: Node) -> dict:
+    return {
+        "op": "add_node",
+        "id": node.id,
+        "branch_id": node.branch_id,
+        "sequence": node.sequence,
+        "content": node.content,
+        "prompt": node.prompt,
+        "model_name": node.model_name,
+        "author": node.author,
+        "created_at": node.created_at.isoformat(),
+    }
+
+
+def removal_op(session: Session) -> dict:
+    """Describe everything marked for deletion in the session (including cascades).
+    Must be called before the session is flushed, so deletes should be issued
+    under `session.no_autoflush`."""
+    return {
+        "op": "remove",
+        "branch_ids": sorted(o.id for o in session.deleted if isinstance(o, Branch)),
+        "node_ids": sorted(o.id for o in session.deleted if isinstance(o, Node)),
+    }
+
+
+def empty_state() -> dict:
+    return {"name": "", "branches": {}, "nodes": {}}
+
+
+def apply_ops(state: dict, ops: List[dict]) -> dict:
+    for op in ops:
+        kind = op["op"]
+        if kind == "create_graph":
+            state["name"] = op["name"]
+        elif kind == "add_branch":
+            state["branches"][str(op["id"])] = {k: v for k, v in op.items() if k != "op"}
+        elif kind == "add_node":
+            state["nodes"][str(op["id"])] = {k: v for k, v in op.items() if k != "op"}
+        elif kind == "remove":
+            for branch_id in op["branch_ids"]:
+                state["branches"].pop(str(branch_id), None)
+            for node_id in op["node_ids"]:
+                state["nodes"].pop(str(node_id), None)
+        else:
+            raise ValueError(f"Unknown history operation '{kind}'")
+    return state
+
+
+def graph_from_state(graph_id: str, state: dict) -> Graph:
+    """Build detached Graph/Branch/Node objects from a state, for rendering responses."""
+    graph = Graph(id=graph_id, name=state["name"])
+    branches = {}
+    for b in sorted(state["branches"].values(), key=lambda b: b["id"]):
+        branches[b["id"]] = Branch(
+            id=b["id"], label=b["label"], parent_node_id=b["parent_node_id"], graph=graph
+        )
+    for n in state["nodes"].values():
+        branch = branches.get(n["branch_id"])
+        if branch is None:
+            continue
+        Node(
+            id=n["id"],
+            sequence=n["sequence"],
+            content=n["content"],
+            prompt=n["prompt"],
+            model_name=n["model_name"],
+            author=n["author"],
+            created_at=datetime.fromisoformat(n["created_at"]),
+            branch=branch,
+        )
+    return graph
+
+
+class HistoryService:
+    """
+    Event-sourced history for graphs.
+
+    Each mutation appends a GraphEvent and updates the graph's derived indexes
+    (NodeAncestry, GraphSummary); every HISTORY_SNAPSHOT_INTERVAL events along
+    a line of history the full state is stored as a GraphSnapshot. Any version
+    is rebuilt from its nearest snapshot ancestor, so reconstruction replays
+    fewer than HISTORY_SNAPSHOT_INTERVAL events however long the history is.
+    """
+
+    @property
+    def interval(self) -> int:
+        return max(1, settings.HISTORY_SNAPSHOT_INTERVAL)
+
+    def state_from_db(self, session: Session, graph_id: str) -> dict:
+        """Read the live (materialized) state of a graph from the hot tables."""
+        graph = session.get(Graph, graph_id)
+        state = empty_state()
+        state["name"] = graph.name if graph else ""
+        for branch in session.exec(select(Branch).where(Branch.graph_id == graph_id)):
+            state["branches"][str(branch.id)] = {
+                k: v for k, v in branch_op(branch).items() if k != "op"
+            }
+        nodes = session.exec(
+            select(Node).join(Branch, Node.branch_id == Branch.id).where(Branch.graph_id == graph_id)
+        )
+        for node in nodes:
+            state["nodes"][str(node.id)] = {k: v for k, v in node_op(node).items() if k != "op"}
+        return state
+
+    def record(self, session: Session, graph_id: str, kind: str, ops: List[dict]) -> GraphEvent:
+        """
+        Append an event for a mutation the caller has already applied (and flushed)
+        in `session`. The caller commits.
+        """
+        head = self._lock_head(session, graph_id) or GraphHistory(graph_id=graph_id)
+        parent = self._get_event(session, graph_id, head.current_version)
+
+        event = GraphEvent(
+            graph_id=graph_id,
+            version=head.latest_version + 1,
+            parent_version=parent.version if parent else 0,
+            depth=(parent.depth if parent else 0) + 1,
+            kind=kind,
+            payload=json.dumps(ops),
+        )
+        head.current_version = head.latest_version = event.version
+        session.add(head)
+        session.add(event)
+        ancestry_service.on_mutation(session, graph_id, ops)
+        summary_service.on_mutation(session, graph_id, ops)
+
+        # The first event of a line always gets a snapshot, which also captures
+        # graphs that already had content before history was recorded.
+        if self._has_snapshot_slot(event):
+            session.flush()
+            self._snapshot(session, graph_id, event.version, self.state_from_db(session, graph_id))
+        return event
+
+    def state_at(self, session: Session, graph_id: str, version: int) -> dict:
+        """Reconstruct the state at `version` from its nearest snapshot ancestor."""
+        pending = []
+        event = self._get_event(session, graph_id, version)
+        if event is None:
+            raise HTTPException(status_code=404, detail=f"Version {version} not found")
+
+        state = None
+        while event is not None:
+            if self._has_snapshot_slot(event):
+                snapshot = session.exec(
+                    select(GraphSnapshot).where(
+                        GraphSnapshot.graph_id == graph_id,
+                        GraphSnapshot.version == event.version,
+                    )
+                ).first()
+                if snapshot:
+                    state = json.loads(snapshot.state)
+                    break
+            pending.append(event)
+            event = self._get_event(session, graph_id, event.parent_version)
+
+        state = state or empty_state()
+        for e in reversed(pending):
+            apply_ops(state, json.loads(e.payload))
+        return state
+
+    def history(self, session: Session, graph_id: str, limit: int = 50) -> tuple:
+        """Return the history head and the newest `limit` events."""
+        head = session.get(GraphHistory, graph_id) or GraphHistory(graph_id=graph_id)
+        events = session.exec(
+            select(GraphEvent)
+            .where(GraphEvent.graph_id == graph_id)
+            .order_by(GraphEvent.version.desc())
+            .limit(limit)
+        ).all()
+        return head, events
+
+    def undo(self, graph_id: str) -> None:
+        with Session(engine) as session:
+            head = self._lock_head(session, graph_id)
+            current = self._get_event(session, graph_id, head.current_version) if head else None
+            # The first event (graph creation or first recorded change) cannot be undone
+            if current is None or current.parent_version == 0:
+                raise HTTPException(status_code=409, detail="Nothing to undo")
+            self._move_to(session, head, current.parent_version)
+
+    def redo(self, graph_id: str) -> None:
+        with Session(engine) as session:
+            head = self._lock_head(session, graph_id)
+            if head is None:
+                raise HTTPException(status_code=409, detail="Nothing to redo")
+            # Follow the most recent line that branched off the current version
+            child = session.exec(
+                select(GraphEvent)
+                .where(
+                    GraphEvent.graph_id == graph_id,
+                    GraphEvent.parent_version == head.current_version,
+                )
+                .order_by(GraphEvent.version.desc())
+            ).first()
+            if child is None:
+                raise HTTPException(status_code=409, detail="Nothing to redo")
+            self._move_to(session, head, child.version)
+
+    def purge(self, session: Session, graph_id: str) -> None:
+        """Drop all history and counters for a graph (used when the graph itself is deleted)."""
+        summary_service.purge(session, graph_id)
+        ancestry_service.purge(session, graph_id)
+        session.execute(delete(GraphSnapshot).where(GraphSnapshot.graph_id == graph_id))
+        session.execute(delete(GraphEvent).where(GraphEvent.graph_id == graph_id))
+        session.execute(delete(GraphHistory).where(GraphHistory.graph_id == graph_id))
+
+    def materialize(self, session: Session, graph_id: str, state: dict) -> None:
+        """Rewrite the hot tables of a graph so they hold exactly `state`."""
+        graph = session.get(Graph, graph_id)
+        graph.name = state["name"]
+
+        branches = {b.id: b for b in session.exec(select(Branch).where(Branch.graph_id == graph_id))}
+        nodes = {
+            n.id: n
+            for n in session.exec(
+                select(Node).join(Branch, Node.branch_id == Branch.id).where(Branch.graph_id == graph_id)
+            )
+        }
+        target_branches = {b["id"]: b for b in state["branches"].values()}
+        target_nodes = {n["id"]: n for n in state["nodes"].values()}
+
+        # Rows are restored under their original ids. Databases whose ids were
+        # reused before the AUTOINCREMENT migration may have handed one to
+        # another graph since; refuse instead of failing on the insert.
+        if self._ids_taken(session, Branch, [bid for bid in target_branches if bid not in branches]) or \
+                self._ids_taken(session, Node, [nid for nid in target_nodes if nid not in nodes]):
+            raise HTTPException(
+                status_code=409,
+                detail="Cannot restore this version: some of its ids now belong to another graph",
+            )
+
+        # Branches and nodes reference each other, so break branch -> node links
+        # first, then delete, insert branches unlinked, insert nodes, and relink.
+        doomed_branches = [bid for bid in branches if bid not in target_branches]
+        doomed_nodes = [nid for nid in nodes if nid not in target_nodes]
+        for bid in doomed_branches:
+            session.expunge(branches.pop(bid))
+        for nid in doomed_nodes:
+            session.expunge(nodes.pop(nid))
+        if doomed_branches:
+            session.execute(update(Branch).where(Branch.id.in_(doomed_branches)).values(parent_node_id=None))
+        if doomed_nodes:
+            session.execute(delete(Node).where(Node.id.in_(doomed_nodes)))
+        if doomed_branches:
+            session.execute(delete(Branch).where(Branch.id.in_(doomed_branches)))
+
+        for bid, b in target_branches.items():
+            if bid in branches:
+                branches[bid].label = b["label"]
+            else:
+                branches[bid] = Branch(id=bid, label=b["label"], graph_id=graph_id)
+                session.add(branches[bid])
+        session.flush()
+
+        for nid, n in target_nodes.items():
+            node = nodes.get(nid) or Node(id=nid)
+            node.branch_id = n["branch_id"]
+            node.sequence = n["sequence"]
+            node.content = n["content"]
+            node.prompt = n["prompt"]
+            node.model_name = n["model_name"]
+            node.author = n["author"]
+            node.created_at = datetime.fromisoformat(n["created_at"])
+            session.add(node)
+        session.flush()
+
+        for bid, b in target_branches.items():
+            branches[bid].parent_node_id = b["parent_node_id"]
+        session.flush()
+
+    # --- internals ----------------------------------------------------------
+
+    def _has_snapshot_slot(self, event: GraphEvent) -> bool:
+        return (event.depth - 1) % self.interval == 0
+
+    def _get_event(self, session: Session, graph_id: str, version: int) -> Optional[GraphEvent]:
+        if not version:
+            return None
+        return session.exec(
+            select(GraphEvent).where(GraphEvent.graph_id == graph_id, GraphEvent.version == version)
+        ).first()
+
+    def _lock_head(self, session: Session, graph_id: str) -> Optional[GraphHistory]:
+        """
+        Load the history head with a row lock, so concurrent mutations of one graph
+        take turns allocating versions (and updating its GraphSummary counters).
+        SQLite ignores FOR UPDATE; there the caller's earlier writes already hold
+        the database write lock.
+        """
+        return session.exec(
+            select(GraphHistory)
+            .where(GraphHistory.graph_id == graph_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        ).first()
+
+    def _ids_taken(self, session: Session, model, ids: List[int]) -> bool:
+        return bool(ids) and session.exec(select(model.id).where(model.id.in_(ids))).first() is not None
+
+    def _snapshot(self, session: Session, graph_id: str, version: int, state: dict) -> None:
+        session.add(GraphSnapshot(graph_id=graph_id, version=version, state=json.dumps(state)))
+
+    def _move_to(self, session: Session, head: GraphHistory, version: int) -> None:
+        state = self.state_at(session, head.graph_id, version)
+        self.materialize(session, head.graph_id, state)
+        ancestry_service.rebuild(session, head.graph_id)
+        summary_service.rebuild(session, head.graph_id)
+        head.current_version = version
+        session.add(head)
+        session.commit()
+
+
+history_service = HistoryService()
@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.db.session import engine
+from app.db.models import Graph, GraphHistory, NodeAncestry
+from app.db.graph_schemas import GraphStateResponse
+from app.core.ancestry_service import ancestry_service
+from app.core.history_service import graph_from_state
+from app.core.archive_service import archive_service
+
+MEDIA_TYPES = {"svg": "image/svg+xml", "png": "image/png"}
+
+
+def _render_dot(source: str, fmt: str) -> bytes:
+    """Runs in a worker process: lay out and rasterize DOT source with Graphviz."""
+    import graphviz
+    return graphviz.Source(source).pipe(format=fmt)
+
+
+def graph_to_dot(graph: GraphStateResponse, node_ids: Optional[Set[int]] = None) -> str:
+    """
+    DOT source for a graph state, drawn like scripts/test_visualizer.py: nodes in
+    a branch are chained, heads are filled, and forks are dashed edges labelled
+    with the branch name. With `node_ids`, only those nodes are drawn.
+    """
+    import graphviz
+
+    def keep(nid: int) -> bool:
+        return node_ids is None or nid in node_ids
+
+    dot = graphviz.Digraph(comment=graph.name)
+    dot.attr("node", shape="circle")
+    for node_id, node in graph.nodes.items():
+        if not keep(node.id):
+            continue
+        if node.isHead:
+            dot.node(node_id, f"Node {node_id}", style="filled", fillcolor="lightblue")
+        else:
+            dot.node(node_id, f"Node {node_id}")
+
+    for branch in graph.branches.values():
+        ids = [nid for nid in branch.nodeIds if keep(nid)]
+        for a, b in zip(ids, ids[1:]):
+            dot.edge(str(a), str(b))
+        if branch.parentNodeId and ids and keep(branch.parentNodeId):
+            dot.edge(str(branch.parentNodeId), str(ids[0]), style="dashed", label=branch.label)
+    return dot.source
+
+
+class RenderService:
+    """
+    Server-side SVG/PNG rendering of graphs and subtrees.
+
+    Graphviz runs in a process pool so layout never blocks the event loop, and
+    output is cached on disk under RENDER_CACHE_DIR keyed by graph id and
+    history version, so a repeat view of an unchanged graph is a file read.
+    """
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        # Created on first render so workers that never render don't pay for it
+        if self._pool is None:
+            # Spawned, not forked: forking a process that runs threads can leave
+            # workers deadlocked on a lock copied mid-acquire
+            self._pool = ProcessPoolExecutor(
+                max_workers=settings.RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def render(self, graph_id: str, fmt: str, node_id: Optional[int] = None) -> bytes:
+        if fmt not in MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unsupported format '{fmt}'")
+
+        version = self._version(graph_id)
+        path = self._cache_path(graph_id, version, fmt, node_id)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+
+        # Concurrent requests for the same image share one render
+        if path in self._inflight:
+            return await asyncio.shield(self._inflight[path])
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[path] = future
+        try:
+            # The graph may have changed since the lookup; cache under the
+            # version the source was actually read at
+            version, source = self._dot_for(graph_id, node_id)
+            try:
+                data = await asyncio.get_running_loop().run_in_executor(
+                    self.pool, _render_dot, source, fmt
+                )
+            except Exception as e:
+                # graphviz.ExecutableNotFound when the `dot` binary is missing
+                raise HTTPException(status_code=503, detail=f"Rendering failed: {e}")
+            if version is not None:
+                self._store(graph_id, self._cache_path(graph_id, version, fmt, node_id), data)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            del self._inflight[path]
+
+    def purge(self, graph_id: str) -> None:
+        """Remove a graph's cached renders, so a new graph under the same id
+        never gets the old one's images."""
+        shutil.rmtree(self._cache_dir(graph_id), ignore_errors=True)
+
+    # --- internals ----------------------------------------------------------
+
+    def _version(self, graph_id: str) -> int:
+        with Session(engine) as session:
+            if not session.get(Graph, graph_id):
+                raise HTTPException(status_code=404, detail="Graph not found")
+            return self._current_version(session, graph_id)
+
+    def _current_version(self, session: Session, graph_id: str) -> int:
+        # A column query, so a second read in the same session isn't served
+        # from the identity map
+        return session.exec(
+            select(GraphHistory.current_version).where(GraphHistory.graph_id == graph_id)
+        ).first() or 0
+
+    def _dot_for(self, graph_id: str, node_id: Optional[int]) -> Tuple[Optional[int], str]:
+        """
+        DOT source for the graph's current state and the version it was read
+        at, both from one session. The version is read before and after the
+        state; if a mutation landed in between it is None and the render is
+        not cached.
+        """
+        from app.api.graphs import convert_graph_to_response
+
+        with Session(engine) as session:
+            if not session.get(Graph, graph_id):
+                raise HTTPException(status_code=404, detail="Graph not found")
+            version = self._current_version(session, graph_id)
+            # Archived graphs render from their archive and stay in cold storage;
+            # their NodeAncestry rows are kept, so subtrees still resolve
+            state = archive_service.archived_state(session, graph_id)
+            graph = graph_from_state(graph_id, state) if state is not None else session.get(Graph, graph_id)
+            node_ids = None
+            if node_id is not None:
+                if state is None:
+                    ancestry_service.ensure_indexed(session, graph_id, node_id)
+                row = session.get(NodeAncestry, node_id)
+                if row is None or row.graph_id != graph_id:
+                    raise HTTPException(status_code=404, detail="Node not found in graph")
+                node_ids = self._subtree(session, graph_id, node_id)
+            source = graph_to_dot(convert_graph_to_response(graph), node_ids)
+            if self._current_version(session, graph_id) != version:
+                version = None
+            return version, source
+
+    def _subtree(self, session: Session, graph_id: str, node_id: int) -> Set[int]:
+        children: Dict[int, list] = {}
+        rows = session.exec(
+            select(NodeAncestry.node_id, NodeAncestry.parent_id).where(NodeAncestry.graph_id == graph_id)
+        )
+        for child, parent in rows:
+            children.setdefault(parent, []).append(child)
+        found, stack = set(), [node_id]
+        while stack:
+            n = stack.pop()
+            found.add(n)
+            stack.extend(children.get(n, []))
+        return found
+
+    def _cache_dir(self, graph_id: str) -> str:
+        # Graph ids are free-form strings; hash them into safe directory names
+        return os.path.join(
+            settings.RENDER_CACHE_DIR, hashlib.sha256(graph_id.encode()).hexdigest()[:24]
+        )
+
+    def _cache_path(self, graph_id: str, version: int, fmt: str, node_id: Optional[int]) -> str:
+        scope = f"n{node_id}" if node_id is not None else "all"
+        return os.path.join(self._cache_dir(graph_id), f"v{version}-{scope}.{fmt}")
+
+    def _store(self, graph_id: str, path: str, data: bytes) -> None:
+        directory = self._cache_dir(graph_id)
+        os.makedirs(directory, exist_ok=True)
+        # Drop renders of older versions of this graph
+        current = os.path.basename(path).split("-")[0]
+        for name in os.listdir(directory):
+            if name.split("-")[0] != current:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+
+render_service = RenderService()
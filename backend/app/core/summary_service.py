@@ -0,0 +1,109 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import delete, func
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlmodel import Session, select
+
+from app.db.session import engine
+from app.db.models import Graph, Branch, Node, GraphEvent, GraphSummary, NodeAncestry
+from app.core.ancestry_service import ancestry_service
+
+
+class SummaryService:
+    """
+    Maintains GraphSummary counters (node/branch counts, max depth, last activity).
+
+    Additions are applied incrementally from the operations a mutation recorded.
+    Depths come from the ancestry index, which is updated first.
+    """
+
+    def on_mutation(self, session: Session, graph_id: str, ops: List[dict]) -> None:
+        """Update counters for operations already applied (but maybe not flushed) in `session`."""
+        summary = session.get(GraphSummary, graph_id)
+        if summary is None:
+            # First mutation of a graph without counters yet: count from scratch
+            session.flush()
+            self.rebuild(session, graph_id)
+            return
+
+        recompute_depth = False
+        for op in ops:
+            kind = op["op"]
+            if kind == "add_branch":
+                summary.branch_count += 1
+            elif kind == "add_node":
+                summary.node_count += 1
+                summary.max_depth = max(summary.max_depth, ancestry_service.depth(session, op["id"]))
+            elif kind == "remove":
+                summary.branch_count -= len(op["branch_ids"])
+                summary.node_count -= len(op["node_ids"])
+                recompute_depth = True
+
+        if recompute_depth:
+            summary.max_depth = ancestry_service.max_depth(session, graph_id)
+        summary.last_activity = datetime.utcnow()
+        session.add(summary)
+
+    def rebuild(self, session: Session, graph_id: str) -> GraphSummary:
+        """Recount a graph's summary from its branches and its (up to date) ancestry index."""
+        summary = session.get(GraphSummary, graph_id) or GraphSummary(graph_id=graph_id)
+        summary.node_count = session.exec(
+            select(func.count()).select_from(NodeAncestry).where(NodeAncestry.graph_id == graph_id)
+        ).one()
+        summary.branch_count = session.exec(
+            select(func.count()).select_from(Branch).where(Branch.graph_id == graph_id)
+        ).one()
+        summary.max_depth = ancestry_service.max_depth(session, graph_id)
+        summary.last_activity = datetime.utcnow()
+        session.add(summary)
+        return summary
+
+    def backfill(self, attempts: int = 3) -> int:
+        """Create summaries for graphs that predate them. Returns how many were built.
+
+        Workers starting together may backfill the same graphs; the loser rolls
+        back and retries, and then finds nothing left to do.
+        """
+        for attempt in range(attempts):
+            try:
+                return self._backfill_once()
+            except (IntegrityError, OperationalError):
+                if attempt == attempts - 1:
+                    raise
+        return 0
+
+    def purge(self, session: Session, graph_id: str) -> None:
+        session.execute(delete(GraphSummary).where(GraphSummary.graph_id == graph_id))
+
+    def _backfill_once(self) -> int:
+        with Session(engine) as session:
+            missing = session.exec(
+                select(Graph.id).where(
+                    ~select(GraphSummary.graph_id)
+                    .where(GraphSummary.graph_id == Graph.id)
+                    .exists()
+                )
+            ).all()
+            for graph_id in missing:
+                ancestry_service.rebuild(session, graph_id)
+                summary = self.rebuild(session, graph_id)
+                # Keep the graph's real idle time rather than the time of this deploy
+                summary.last_activity = self._recorded_activity(session, graph_id) or summary.last_activity
+            session.commit()
+            return len(missing)
+
+    def _recorded_activity(self, session: Session, graph_id: str) -> Optional[datetime]:
+        """Latest timestamp the graph's own rows carry (history events or nodes)."""
+        last_event = session.exec(
+            select(func.max(GraphEvent.created_at)).where(GraphEvent.graph_id == graph_id)
+        ).one()
+        last_node = session.exec(
+            select(func.max(Node.created_at))
+            .join(Branch, Node.branch_id == Branch.id)
+            .where(Branch.graph_id == graph_id)
+        ).one()
+        return max((t for t in (last_event, last_node) if t is not None), default=None)
+
+
+summary_service = SummaryService()
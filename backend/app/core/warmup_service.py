@@ -0,0 +1,97 @@
+import asyncio
+import time
+from typing import Dict, List
+
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.db.session import engine
+from app.db.models import Graph, GraphArchive, GraphSummary
+from app.core.ancestry_service import ancestry_service
+
+
+class WarmupService:
+    """
+    Post-boot work kept off the startup path.
+
+    Runs as a background task once the worker is already serving: opens the
+    pool's connections, loads the most recently active graphs so their pages,
+    ancestry index and SQLAlchemy's compiled-statement cache are warm, and
+    renders them into the render cache so their first view is a file read.
+    """
+
+    async def run(self) -> Dict[str, float]:
+        """Returns the duration of each step in milliseconds."""
+        timings = {}
+
+        started = time.perf_counter()
+        await asyncio.to_thread(self._open_connections)
+        timings["open_connections"] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        graph_ids = await asyncio.to_thread(self._load_recent_graphs, settings.WARMUP_RECENT_GRAPHS)
+        timings[f"load_recent_graphs[{len(graph_ids)}]"] = (time.perf_counter() - started) * 1000
+
+        if settings.WARMUP_RENDER:
+            started = time.perf_counter()
+            rendered = await self._render_graphs(graph_ids)
+            timings[f"render_graphs[{rendered}]"] = (time.perf_counter() - started) * 1000
+        return timings
+
+    def _open_connections(self) -> None:
+        # Check out up to pool_size connections at once so later requests reuse them
+        size = getattr(engine.pool, "size", lambda: 1)()
+        connections = []
+        try:
+            for _ in range(size):
+                connections.append(engine.connect())
+        finally:
+            for connection in connections:
+                connection.close()
+
+    def _load_recent_graphs(self, limit: int) -> List[str]:
+        from app.api.graphs import convert_graph_to_response
+
+        if limit <= 0:
+            return []
+        with Session(engine) as session:
+            graph_ids = session.exec(
+                select(GraphSummary.graph_id)
+                .where(
+                    ~select(GraphArchive.graph_id)
+                    .where(GraphArchive.graph_id == GraphSummary.graph_id)
+                    .exists()
+                )
+                .order_by(GraphSummary.last_activity.desc())
+                .limit(limit)
+            ).all()
+            for graph_id in graph_ids:
+                graph = session.get(Graph, graph_id)
+                if graph is None:
+                    continue
+                convert_graph_to_response(graph)
+                if not ancestry_service.is_indexed(session, graph_id):
+                    ancestry_service.rebuild(session, graph_id)
+            session.commit()
+            return list(graph_ids)
+
+    async def _render_graphs(self, graph_ids: List[str]) -> int:
+        # Imported here so the render service (and its process pool) is only
+        # loaded when this step runs
+        from app.core.render_service import render_service
+
+        rendered = 0
+        for graph_id in graph_ids:
+            try:
+                await render_service.render(graph_id, "svg")
+            except HTTPException as e:
+                if e.status_code == 503:
+                    # No Graphviz on this server; the other graphs would fail too
+                    break
+                continue
+            rendered += 1
+        return rendered
+
+
+warmup_service = WarmupService()
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Dict, Optional
+from datetime import datetime
 
 # Corresponds to your frontend's SerializableNode
 class SerializableNodeResponse(BaseModel):
@@ -26,4 +27,64 @@ class GraphStateResponse(BaseModel):
     branchOrder: List[int]
     nextNodeId: int
     nextBranchId: int
-    nextColorIndex: int
\ No newline at end of file
+    nextColorIndex: int
+
+# One entry of a graph's mutation history
+class GraphEventResponse(BaseModel):
+    version: int
+    parentVersion: int
+    kind: str
+    createdAt: datetime
+
+class GraphHistoryResponse(BaseModel):
+    graphId: str
+    currentVersion: int
+    latestVersion: int
+    events: List[GraphEventResponse]
+
+# Lightweight per-graph entry for GET /graphs
+class GraphSummaryResponse(BaseModel):
+    id: str
+    name: str
+    nodeCount: int
+    branchCount: int
+    maxDepth: int
+    lastActivity: datetime
+    # True while the graph's nodes live in cold storage; the next GET restores them
+    archived: bool = False
+
+class GraphListResponse(BaseModel):
+    items: List[GraphSummaryResponse]
+    # Pass back as `cursor` to fetch the next page; None on the last page
+    nextCursor: Optional[str] = None
+
+# One side of a compare: what it added since the common ancestor
+class CompareSideResponse(BaseModel):
+    nodeId: int
+    depth: int
+    divergentCount: int
+    # Root-side first; truncated to the request's `limit`
+    nodeIds: List[int]
+
+class CompareResponse(BaseModel):
+    commonAncestorId: Optional[int] = None
+    commonAncestorDepth: int
+    left: CompareSideResponse
+    right: CompareSideResponse
+
+# Hot tables versus cold-storage archive, for GET /metrics/storage
+class HotStorageResponse(BaseModel):
+    graphs: int
+    branches: int
+    nodes: int
+    contentBytes: int
+
+class ArchivedStorageResponse(BaseModel):
+    graphs: int
+    nodes: int
+    rawBytes: int
+    compressedBytes: int
+
+class StorageMetricsResponse(BaseModel):
+    hot: HotStorageResponse
+    archived: ArchivedStorageResponse
@@ -1,4 +1,5 @@
 from typing import List, Optional
+from sqlalchemy import UniqueConstraint
 from sqlmodel import Field, SQLModel, Relationship
 from datetime import datetime
 
@@ -17,6 +18,9 @@ class Graph(SQLModel, table=True):
 
 
 class Branch(SQLModel, table=True):
+    # Never reuse ids on SQLite: history and archives restore rows by their original id
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id: Optional[int] = Field(default=None, primary_key=True)
     label: str
 
@@ -43,6 +47,8 @@ class Branch(SQLModel, table=True):
 
 
 class Node(SQLModel, table=True):
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id: Optional[int] = Field(default=None, primary_key=True)
     sequence: int
 
@@ -70,6 +76,83 @@ class Node(SQLModel, table=True):
     )
 
 
+class GraphHistory(SQLModel, table=True):
+    """Per-graph pointer into the event log (which version is live, which is newest)."""
+    graph_id: str = Field(foreign_key="graph.id", primary_key=True)
+    current_version: int = 0
+    latest_version: int = 0
+
+
+class GraphEvent(SQLModel, table=True):
+    """Append-only record of one graph mutation.
+
+    Versions form a tree: undo moves the current version to `parent_version`,
+    and a mutation made after an undo starts a new line from there.
+    """
+    __table_args__ = (UniqueConstraint("graph_id", "version"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    graph_id: str = Field(foreign_key="graph.id", index=True)
+    version: int
+    parent_version: int = Field(default=0, index=True)
+    # Number of events between this one and the start of history
+    depth: int
+    kind: str
+    # JSON list of state operations (see app.core.history_service)
+    payload: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class GraphSnapshot(SQLModel, table=True):
+    """Materialized graph state at a version, so replays start close to their target."""
+    __table_args__ = (UniqueConstraint("graph_id", "version"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    graph_id: str = Field(foreign_key="graph.id", index=True)
+    version: int
+    state: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class GraphSummary(SQLModel, table=True):
+    """Per-graph counters kept up to date by every mutation, so listings never load nodes."""
+    graph_id: str = Field(foreign_key="graph.id", primary_key=True)
+    node_count: int = Field(default=0, index=True)
+    branch_count: int = 0
+    # Longest root-to-node path, counted in nodes
+    max_depth: int = Field(default=0, index=True)
+    last_activity: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class NodeAncestry(SQLModel, table=True):
+    """
+    Index row for one node: its parent (previous node in the branch, or the
+    node the branch forked from), its depth and its 1st, 2nd, 4th, ...
+    ancestors (binary lifting).
+
+    node_id deliberately has no foreign key so index rows can be dropped in the
+    same flush as the nodes they describe, in any order.
+    """
+    node_id: int = Field(primary_key=True)
+    graph_id: str = Field(index=True)
+    branch_id: int = Field(index=True)
+    parent_id: Optional[int] = Field(default=None, index=True)
+    # Nodes on the path from the root, inclusive (the root has depth 1)
+    depth: int
+    # JSON list; entry k is the 2**k-th ancestor
+    jumps: str = "[]"
+
+
+class GraphArchive(SQLModel, table=True):
+    """Cold-storage copy of an idle graph's branches and nodes (zlib-compressed JSON state)."""
+    graph_id: str = Field(foreign_key="graph.id", primary_key=True)
+    data: bytes
+    raw_size: int
+    compressed_size: int
+    node_count: int
+    archived_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 # Resolve forward references
 Graph.model_rebuild()
 Branch.model_rebuild()
@@ -1,26 +1,95 @@
+from sqlalchemy import event
+from sqlalchemy.schema import CreateTable
 from sqlmodel import SQLModel, Session, create_engine
-import os
-
-# Prefer env DATABASE_URL; otherwise use a local SQLite file for easy testing
-BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-DEFAULT_SQLITE_PATH = os.path.join(BACKEND_DIR, "cactus.db")
-DATABASE_URL = os.getenv("DATABASE_URL") or f"sqlite:///{DEFAULT_SQLITE_PATH}"
-
-# For SQLite, we need check_same_thread=False for FastAPI's threaded server
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL,
-        echo=True,
+
+from app.config import settings
+
+DATABASE_URL = settings.DATABASE_URL
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    return _is_sqlite(url) and (":memory:" in url or url == "sqlite://")
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune each new SQLite connection: WAL lets readers run alongside a writer,
+    busy_timeout makes writers wait for the lock instead of failing immediately."""
+    cursor = dbapi_connection.cursor()
+    if settings.SQLITE_JOURNAL_MODE:
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    if settings.SQLITE_SYNCHRONOUS:
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    if settings.SQLITE_CACHE_SIZE_KB:
+        # Negative cache_size is interpreted by SQLite as KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    cursor.close()
+
+
+def build_engine(database_url: str = DATABASE_URL):
+    """Create an engine configured from Settings (pool options, SQLite pragmas)."""
+    kwargs = {"echo": settings.DB_ECHO}
+    if not _is_sqlite_memory(database_url):
+        kwargs.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+
+    if not _is_sqlite(database_url):
+        return create_engine(database_url, **kwargs)
+
+    # For SQLite, we need check_same_thread=False for FastAPI's threaded server
+    new_engine = create_engine(
+        database_url,
         connect_args={"check_same_thread": False},
+        **kwargs,
     )
-else:
-    engine = create_engine(DATABASE_URL, echo=True)
+    event.listen(new_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
+
+engine = build_engine()
 
 # Dependency for FastAPI routes
 def get_session():
     with Session(engine) as session:
         yield session
 
+def _migrate_sqlite_autoincrement(connection) -> None:
+    """Rebuild `branch`/`node` tables created before they used AUTOINCREMENT.
+
+    Without it SQLite hands freed ids out again, while history restores rows
+    under their original ids. Rows keep their ids; the sequence starts at the
+    current maximum.
+    """
+    for name in ("branch", "node"):
+        table = SQLModel.metadata.tables[name]
+        ddl = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).scalar()
+        if ddl is None or "AUTOINCREMENT" in ddl.upper():
+            continue
+        rebuilt = f"_{name}_autoincrement"
+        create = str(CreateTable(table).compile(dialect=connection.dialect))
+        connection.exec_driver_sql(create.replace(f"CREATE TABLE {name} ", f"CREATE TABLE {rebuilt} ", 1))
+        columns = ", ".join(column.name for column in table.columns)
+        connection.exec_driver_sql(f"INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {name}")
+        connection.exec_driver_sql(f"DROP TABLE {name}")
+        connection.exec_driver_sql(f"ALTER TABLE {rebuilt} RENAME TO {name}")
+        for index in table.indexes:
+            index.create(connection)
+
+
 # Create tables on startup
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    if _is_sqlite(DATABASE_URL):
+        with engine.begin() as connection:
+            _migrate_sqlite_autoincrement(connection)
@@ -1,21 +1,70 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
+from app.config import settings
 from app.db.session import create_db_and_tables
 
 # Routers
-from app.api import graphs, nodes
+from app.api import graphs, nodes, branches, metrics
+
+# uvicorn configures this logger, so messages show up next to its own startup lines
+logger = logging.getLogger("uvicorn.error")
+
+
+async def _warm_up():
+    """Background post-boot work; the worker is already serving while this runs."""
+    from app.core.warmup_service import warmup_service
+    try:
+        timings = await warmup_service.run()
+    except Exception as e:
+        logger.warning("Warm-up failed: %s", e)
+        return
+    if settings.STARTUP_PROFILE:
+        for step, ms in timings.items():
+            logger.info("Startup profile: warm-up %s %.1f ms", step, ms)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Ensure models are imported so SQLModel knows about them
-    from app.db import models  # noqa: F401
-    print("Creating database and tables...")
-    create_db_and_tables()
+    started = time.perf_counter()
+    if settings.DB_CREATE_TABLES_ON_STARTUP:
+        # Ensure models are imported so SQLModel knows about them
+        from app.db import models  # noqa: F401
+        logger.info("Creating database and tables...")
+        create_db_and_tables()
+    create_tables_ms = (time.perf_counter() - started) * 1000
+
+    # Blocking, because GET /graphs only lists graphs that have a summary. When
+    # every graph has one this is a single anti-join.
+    from app.core.summary_service import summary_service
+    backfilled = summary_service.backfill()
+    if backfilled:
+        logger.info("Built summaries for %d existing graph(s).", backfilled)
+    backfill_ms = (time.perf_counter() - started) * 1000 - create_tables_ms
+
+    background = [asyncio.create_task(_warm_up())]
+    if settings.ARCHIVE_ENABLED:
+        from app.core.archive_service import archive_service
+        background.append(asyncio.create_task(archive_service.run_periodically()))
+
+    if settings.STARTUP_PROFILE:
+        logger.info("Startup profile: imports %.1f ms", IMPORT_MS)
+        logger.info("Startup profile: create tables %.1f ms", create_tables_ms)
+        logger.info("Startup profile: summary backfill %.1f ms", backfill_ms)
+        logger.info("Startup profile: lifespan %.1f ms", (time.perf_counter() - started) * 1000)
     yield
-    print("Shutting down...")
+    logger.info("Shutting down...")
+    for task in background:
+        task.cancel()
+    from app.core.render_service import render_service
+    render_service.shutdown()
 
 
 app = FastAPI(
@@ -41,6 +90,11 @@ app.add_middleware(
 # Mount API routers under /api
 app.include_router(graphs.router, prefix="/api")
 app.include_router(nodes.router, prefix="/api")
+app.include_router(branches.router, prefix="/api")
+app.include_router(metrics.router, prefix="/api")
+
+# Time spent importing this module (FastAPI, SQLAlchemy, models, routers)
+IMPORT_MS = (time.perf_counter() - _IMPORT_STARTED) * 1000
 
 
 @app.get("/")
@@ -0,0 +1,117 @@
+"""
+Concurrent read/write throughput on SQLite, before and after engine tuning.
+
+"before" is the engine as it used to be built (default pool, rollback journal,
+no busy timeout); "after" is app.db.session.build_engine() driven by Settings
+(pool options, WAL, busy_timeout, synchronous=NORMAL, larger page cache).
+
+Usage:
+    python scripts/bench_db.py [--seconds 5] [--readers 8] [--writers 2]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+# Ensure the backend package (app/) is importable regardless of cwd
+CURRENT_DIR = os.path.dirname(__file__)
+BACKEND_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+os.environ.setdefault("DB_ECHO", "false")
+
+from app.db.models import Graph, Branch, Node  # noqa: E402
+from app.db.session import build_engine  # noqa: E402
+
+
+def seed(engine, nodes: int = 200) -> tuple:
+    """Create a read branch with `nodes` nodes and an empty branch for writers,
+    so the read working set stays constant however many writes land."""
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        graph = Graph(id="bench", name="Project bench")
+        read_branch = Branch(label="Main Chat", graph=graph)
+        write_branch = Branch(label="Writes", graph=graph)
+        for i in range(1, nodes + 1):
+            session.add(Node(sequence=i, content=f"seed {i}", created_at=datetime.utcnow(), branch=read_branch))
+        session.add(graph)
+        session.add(write_branch)
+        session.commit()
+        return read_branch.id, write_branch.id
+
+
+def run_workload(engine, branch_ids: tuple, seconds: float, readers: int, writers: int) -> dict:
+    read_branch_id, write_branch_id = branch_ids
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def reader():
+        done = errors = 0
+        while time.perf_counter() < stop:
+            try:
+                with Session(engine) as session:
+                    session.exec(select(Node).where(Node.branch_id == read_branch_id)).all()
+                done += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counts["reads"] += done
+            counts["errors"] += errors
+
+    def writer():
+        done = errors = 0
+        while time.perf_counter() < stop:
+            try:
+                with Session(engine) as session:
+                    session.add(Node(sequence=0, content="bench write", created_at=datetime.utcnow(), branch_id=write_branch_id))
+                    session.commit()
+                done += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counts["writes"] += done
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return counts
+
+
+def bench(label: str, make_engine, args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = make_engine(url)
+        branch_ids = seed(engine)
+        c = run_workload(engine, branch_ids, args.seconds, args.readers, args.writers)
+        engine.dispose()
+    print(
+        f"{label:<7} reads/s={c['reads'] / args.seconds:9.1f}  "
+        f"writes/s={c['writes'] / args.seconds:8.1f}  errors={c['errors']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{args.readers} readers / {args.writers} writers, {args.seconds:g}s each")
+    bench("before", lambda url: create_engine(url, connect_args={"check_same_thread": False}), args)
+    bench("after", build_engine, args)
+
+
+if __name__ == "__main__":
+    main()
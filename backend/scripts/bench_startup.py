@@ -0,0 +1,128 @@
+"""
+Time-to-first-request for a fresh uvicorn worker.
+
+Seeds a temporary SQLite database, then boots `uvicorn app.main:app` several
+times per configuration and measures:
+  * boot:   process start -> first successful GET /
+  * first:  latency of the first GET /api/graphs/{id} for a recently active graph
+  * second: latency of the same request again
+
+Configurations:
+  default  create_all on startup, no warm-up
+  no-ddl   skip create_all (schema already exists), no warm-up
+  lean     skip create_all, warm up recent graphs
+
+Usage:
+    python scripts/bench_startup.py [--runs 5] [--graphs 50] [--nodes 40]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+# Ensure the backend package (app/) is importable regardless of cwd
+CURRENT_DIR = os.path.dirname(__file__)
+BACKEND_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+CONFIGS = {
+    "default": {"DB_CREATE_TABLES_ON_STARTUP": "true", "WARMUP_RECENT_GRAPHS": "0"},
+    "no-ddl": {"DB_CREATE_TABLES_ON_STARTUP": "false", "WARMUP_RECENT_GRAPHS": "0"},
+    "lean": {"DB_CREATE_TABLES_ON_STARTUP": "false", "WARMUP_RECENT_GRAPHS": "20"},
+}
+
+
+def seed(database_url: str, graphs: int, nodes: int) -> str:
+    """Create `graphs` graphs of `nodes` nodes each; returns the most recent graph id."""
+    env = dict(os.environ, DATABASE_URL=database_url, DB_ECHO="false", ARCHIVE_ENABLED="false")
+    code = f"""
+import random
+from app.db.session import create_db_and_tables
+from app.core.agent_service import agent_service
+create_db_and_tables()
+random.seed(0)
+for g in range({graphs}):
+    graph_id = f"bench-{{g:04d}}"
+    agent_service.create_root_node(graph_id, "root")
+    ids = [1 + g * {nodes}]
+    for _ in range({nodes} - 1):
+        parent = random.choice(ids)
+        if random.random() < 0.8:
+            agent_service.extend_branch(parent, content="reply " * 40)
+        else:
+            agent_service.create_sub_branch(parent, "fork", "fork " * 40)
+        ids.append(ids[-1] + 1)
+"""
+    subprocess.run([sys.executable, "-c", code], cwd=BACKEND_ROOT, env=env, check=True)
+    return f"bench-{graphs - 1:04d}"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def timed_get(url: str) -> float:
+    started = time.perf_counter()
+    with urllib.request.urlopen(url) as response:
+        response.read()
+    return (time.perf_counter() - started) * 1000
+
+
+def boot_once(database_url: str, config: dict, graph_id: str) -> tuple:
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, DB_ECHO="false", ARCHIVE_ENABLED="false", **config)
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_ROOT,
+        env=env,
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        while True:
+            try:
+                timed_get(base + "/")
+                break
+            except OSError:
+                if proc.poll() is not None:
+                    raise RuntimeError("uvicorn exited during startup")
+                time.sleep(0.005)
+        boot = (time.perf_counter() - started) * 1000
+        # Give background warm-up a moment, as a real worker would have before traffic
+        time.sleep(0.5)
+        first = timed_get(f"{base}/api/graphs/{graph_id}")
+        second = timed_get(f"{base}/api/graphs/{graph_id}")
+        return boot, first, second
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--graphs", type=int, default=50)
+    parser.add_argument("--nodes", type=int, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        graph_id = seed(database_url, args.graphs, args.nodes)
+        print(f"{args.graphs} graphs x {args.nodes} nodes, median of {args.runs} boots (ms)")
+        print(f"{'config':<8} {'boot':>8} {'first':>8} {'second':>8}")
+        for name, config in CONFIGS.items():
+            results = [boot_once(database_url, config, graph_id) for _ in range(args.runs)]
+            boot, first, second = (statistics.median(r[i] for r in results) for i in range(3))
+            print(f"{name:<8} {boot:8.1f} {first:8.1f} {second:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
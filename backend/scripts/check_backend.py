@@ -1,6 +1,7 @@
 import os
 import sys
 from fastapi.testclient import TestClient
+from sqlmodel import Session
 
 # Ensure the backend package (app/) is importable regardless of cwd
 CURRENT_DIR = os.path.dirname(__file__)
@@ -9,6 +10,9 @@ if BACKEND_ROOT not in sys.path:
     sys.path.insert(0, BACKEND_ROOT)
 
 from app.main import app
+from app.db.session import engine
+from app.core.archive_service import archive_service
+from app.core.render_service import render_service
 
 
 def pick_root_head_node(graph: dict) -> int | None:
@@ -32,87 +36,186 @@ def pretty(ok: bool) -> str:
 
 
 def run():
-    client = TestClient(app)
-    gid = "smoke-test-graph"
-    all_ok = True
-
-    # 1) Fetch-or-create graph
-    r = client.get(f"/api/graphs/{gid}")
-    ok = r.status_code == 200 and r.json().get("id") == gid
-    print(f"1) GET /graphs -> {pretty(ok)}")
-    all_ok &= ok
-
-    # 2) Create root node (idempotent)
-    r = client.post(
-        f"/api/graphs/{gid}/root",
-        json={"content": "Hello root", "author": "user"},
-    )
-    j = r.json()
-    root_head = pick_root_head_node(j)
-    ok = r.status_code == 200 and root_head is not None
-    print(f"2) POST /graphs/{{id}}/root -> {pretty(ok)} (root_head={root_head})")
-    all_ok &= ok
-
-    # 3) Extend root branch
-    r = client.post(
-        f"/api/nodes/{root_head}/extend",
-        json={"content": "Second", "author": "user"},
-    )
-    j = r.json()
-    new_head = pick_root_head_node(j)
-    ok = r.status_code == 200 and new_head is not None and new_head != root_head
-    print(f"3) POST /nodes/{{root}}/extend -> {pretty(ok)} (new_head={new_head})")
-    all_ok &= ok
-
-    # 4) Create sub-branch off original root node
-    r = client.post(
-        f"/api/nodes/{root_head}/branch",
-        json={"label": "Exploration", "initial_prompt": "Fork here"},
-    )
-    j = r.json()
-    branches = list(j.get("branches", {}).values())
-    sub = [b for b in branches if b.get("parentNodeId") == root_head]
-    ok = r.status_code == 200 and len(sub) == 1 and len(sub[0].get("nodeIds", [])) == 1
-    print(f"4) POST /nodes/{{root}}/branch -> {pretty(ok)} (new_branch_id={sub[0]['id'] if sub else None})")
-    all_ok &= ok
-
-    # 5) Delete children of root (removes sub-branches)
-    r = client.post(f"/api/nodes/{root_head}/delete-children")
-    j = r.json()
-    branches = list(j.get("branches", {}).values())
-    sub_after = [b for b in branches if b.get("parentNodeId") == root_head]
-    ok = r.status_code == 200 and len(sub_after) == 0
-    print(f"5) POST /nodes/{{root}}/delete-children -> {pretty(ok)}")
-    all_ok &= ok
-
-    # 6) Extend again to create a mid node
-    r = client.post(
-        f"/api/nodes/{root_head}/extend",
-        json={"content": "Third", "author": "user"},
-    )
-    j = r.json()
-    mid = pick_root_head_node(j)  # head after extend
-    ok = r.status_code == 200 and mid is not None and mid != root_head
-    print(f"6) Extend again -> {pretty(ok)} (mid={mid})")
-    all_ok &= ok
-
-    # 7) Delete extension above mid (keeps mid only)
-    r = client.post(f"/api/nodes/{mid}/delete-extension")
-    j = r.json()
-    branches = list(j.get("branches", {}).values())
-    root_branch = next((b for b in branches if b.get("parentNodeId") is None), None)
-    ok = r.status_code == 200 and root_branch and root_branch.get("nodeIds") == [mid]
-    print(f"7) POST /nodes/{{mid}}/delete-extension -> {pretty(ok)}")
-    all_ok &= ok
-
-    # 8) Delete entire graph
-    r = client.delete(f"/api/graphs/{gid}")
-    ok = r.status_code == 204
-    print(f"8) DELETE /graphs/{{id}} -> {pretty(ok)}")
-    all_ok &= ok
-
-    print("\nOverall:", pretty(all_ok))
-    return 0 if all_ok else 1
+    # Entering the client runs the app lifespan, which creates the tables
+    with TestClient(app) as client:
+        gid = "smoke-test-graph"
+        all_ok = True
+
+        # 1) Fetch-or-create graph
+        r = client.get(f"/api/graphs/{gid}")
+        ok = r.status_code == 200 and r.json().get("id") == gid
+        print(f"1) GET /graphs -> {pretty(ok)}")
+        all_ok &= ok
+
+        # 2) Create root node (idempotent)
+        r = client.post(
+            f"/api/graphs/{gid}/root",
+            json={"content": "Hello root", "author": "user"},
+        )
+        j = r.json()
+        root_head = pick_root_head_node(j)
+        ok = r.status_code == 200 and root_head is not None
+        print(f"2) POST /graphs/{{id}}/root -> {pretty(ok)} (root_head={root_head})")
+        all_ok &= ok
+
+        # 3) Extend root branch
+        r = client.post(
+            f"/api/nodes/{root_head}/extend",
+            json={"content": "Second", "author": "user"},
+        )
+        j = r.json()
+        new_head = pick_root_head_node(j)
+        ok = r.status_code == 200 and new_head is not None and new_head != root_head
+        print(f"3) POST /nodes/{{root}}/extend -> {pretty(ok)} (new_head={new_head})")
+        all_ok &= ok
+
+        # 4) Create sub-branch off original root node
+        r = client.post(
+            f"/api/nodes/{root_head}/branch",
+            json={"label": "Exploration", "initial_prompt": "Fork here"},
+        )
+        j = r.json()
+        branches = list(j.get("branches", {}).values())
+        sub = [b for b in branches if b.get("parentNodeId") == root_head]
+        ok = r.status_code == 200 and len(sub) == 1 and len(sub[0].get("nodeIds", [])) == 1
+        print(f"4) POST /nodes/{{root}}/branch -> {pretty(ok)} (new_branch_id={sub[0]['id'] if sub else None})")
+        all_ok &= ok
+
+        # 5) Compare the root branch head with the sub-branch: they diverge at the root node
+        sub_node = sub[0]["nodeIds"][0] if sub else None
+        r = client.get(f"/api/nodes/{new_head}/compare/{sub_node}")
+        j = r.json()
+        ok = (
+            r.status_code == 200
+            and j.get("commonAncestorId") == root_head
+            and j["left"]["nodeIds"] == [new_head]
+            and j["right"]["nodeIds"] == [sub_node]
+        )
+        print(f"5) GET /nodes/{{a}}/compare/{{b}} -> {pretty(ok)}")
+        all_ok &= ok
+
+        # 6) Delete children of root (removes sub-branches)
+        r = client.post(f"/api/nodes/{root_head}/delete-children")
+        j = r.json()
+        branches = list(j.get("branches", {}).values())
+        sub_after = [b for b in branches if b.get("parentNodeId") == root_head]
+        ok = r.status_code == 200 and len(sub_after) == 0
+        print(f"6) POST /nodes/{{root}}/delete-children -> {pretty(ok)}")
+        all_ok &= ok
+
+        # 7) Extend again to create a mid node
+        r = client.post(
+            f"/api/nodes/{root_head}/extend",
+            json={"content": "Third", "author": "user"},
+        )
+        j = r.json()
+        mid = pick_root_head_node(j)  # head after extend
+        ok = r.status_code == 200 and mid is not None and mid != root_head
+        print(f"7) Extend again -> {pretty(ok)} (mid={mid})")
+        all_ok &= ok
+
+        # 8) Delete extension above mid (keeps mid only)
+        r = client.post(f"/api/nodes/{mid}/delete-extension")
+        j = r.json()
+        branches = list(j.get("branches", {}).values())
+        root_branch = next((b for b in branches if b.get("parentNodeId") is None), None)
+        ok = r.status_code == 200 and root_branch and root_branch.get("nodeIds") == [mid]
+        print(f"8) POST /nodes/{{mid}}/delete-extension -> {pretty(ok)}")
+        all_ok &= ok
+
+        # 9) History lists every mutation, newest first
+        r = client.get(f"/api/graphs/{gid}/history")
+        j = r.json()
+        events = j.get("events", [])
+        ok = (
+            r.status_code == 200
+            and j.get("currentVersion") == j.get("latestVersion")
+            and bool(events)
+            and events[0].get("kind") == "delete_extension"
+        )
+        print(f"9) GET /graphs/{{id}}/history -> {pretty(ok)} (currentVersion={j.get('currentVersion')})")
+        all_ok &= ok
+
+        # 10) Undo the delete-extension (restores the deleted root nodes)
+        r = client.post(f"/api/graphs/{gid}/undo")
+        j = r.json()
+        root_branch = next((b for b in j.get("branches", {}).values() if b.get("parentNodeId") is None), None)
+        ok = r.status_code == 200 and root_branch and len(root_branch.get("nodeIds", [])) > 1
+        print(f"10) POST /graphs/{{id}}/undo -> {pretty(ok)}")
+        all_ok &= ok
+
+        # 11) Redo it again
+        r = client.post(f"/api/graphs/{gid}/redo")
+        j = r.json()
+        root_branch = next((b for b in j.get("branches", {}).values() if b.get("parentNodeId") is None), None)
+        ok = r.status_code == 200 and root_branch and root_branch.get("nodeIds") == [mid]
+        print(f"11) POST /graphs/{{id}}/redo -> {pretty(ok)}")
+        all_ok &= ok
+
+        # 12) Time travel to the version right after the sub-branch was created
+        branch_version = next((e["version"] for e in events if e.get("kind") == "branch"), None)
+        r = client.get(f"/api/graphs/{gid}/versions/{branch_version}")
+        j = r.json()
+        sub = [b for b in j.get("branches", {}).values() if b.get("parentNodeId") == root_head]
+        ok = r.status_code == 200 and len(sub) == 1
+        print(f"12) GET /graphs/{{id}}/versions/{{n}} -> {pretty(ok)} (n={branch_version})")
+        all_ok &= ok
+
+        # 13) Listing reports the live graph's counters (after redo: one node, one branch)
+        r = client.get("/api/graphs", params={"q": gid, "limit": 200})
+        j = r.json()
+        item = next((i for i in j.get("items", []) if i.get("id") == gid), None)
+        ok = (
+            r.status_code == 200
+            and item is not None
+            and (item["nodeCount"], item["branchCount"], item["maxDepth"]) == (1, 1, 1)
+        )
+        print(f"13) GET /graphs -> {pretty(ok)}")
+        all_ok &= ok
+
+        # 14) Archive the graph; a node route rehydrates it transparently
+        with Session(engine) as session:
+            archive_service.archive_graph(session, gid)
+            session.commit()
+        r = client.post(
+            f"/api/nodes/{mid}/extend",
+            json={"content": "After archive", "author": "user"},
+        )
+        j = r.json()
+        root_branch = next((b for b in j.get("branches", {}).values() if b.get("parentNodeId") is None), None)
+        ok = r.status_code == 200 and root_branch and len(root_branch.get("nodeIds", [])) == 2
+        print(f"14) POST /nodes/{{id}}/extend on archived graph -> {pretty(ok)}")
+        all_ok &= ok
+
+        # 15) Render: 404 for a missing graph; the second request is served from
+        # the disk cache. Without the Graphviz `dot` binary both requests are 503.
+        missing = client.get("/api/graphs/no-such-graph/render")
+        first = client.get(f"/api/graphs/{gid}/render")
+        second = client.get(f"/api/graphs/{gid}/render")
+        cache_dir = render_service._cache_dir(gid)
+        if first.status_code == 503:
+            ok = missing.status_code == 404 and second.status_code == 503
+            note = "dot not installed"
+        else:
+            ok = (
+                missing.status_code == 404
+                and first.status_code == second.status_code == 200
+                and first.content == second.content
+                and os.path.isdir(cache_dir)
+                and len(os.listdir(cache_dir)) == 1
+            )
+            note = "cached"
+        print(f"15) GET /graphs/{{id}}/render -> {pretty(ok)} ({note})")
+        all_ok &= ok
+
+        # 16) Delete entire graph (and its cached renders)
+        r = client.delete(f"/api/graphs/{gid}")
+        ok = r.status_code == 204 and not os.path.exists(cache_dir)
+        print(f"16) DELETE /graphs/{{id}} -> {pretty(ok)}")
+        all_ok &= ok
+
+        print("\nOverall:", pretty(all_ok))
+        return 0 if all_ok else 1
 
 
 if __name__ == "__main__":